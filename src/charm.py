@@ -4,9 +4,11 @@
 
 """Charmed operator for the 5G uesim service."""
 
+import functools
+import hashlib
 import logging
-from typing import Optional
-from jinja2 import Environment, FileSystemLoader
+import operator
+import pathlib
 from lightkube.core.client import Client
 from lightkube.models.core_v1 import ServicePort, ServiceSpec
 from lightkube.models.meta_v1 import ObjectMeta
@@ -14,8 +16,8 @@ from lightkube.resources.core_v1 import Service
 from ops.charm import CharmBase, InstallEvent, RemoveEvent
 from ops.framework import EventBase, StoredState
 from ops.main import main
-from ops.model import ActiveStatus, BlockedStatus, WaitingStatus
-from ops.pebble import Layer
+from ops.model import ActiveStatus, BlockedStatus, StatusBase, WaitingStatus
+from ops.pebble import Layer, PathError
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +26,23 @@ UE_CONFIG_FILE_NAME = "ue.yaml"
 DEFAULT_FIELD_MANAGER = "controller"
 GTP_PORT = 4997
 
+_REQUIRED_CONFIG_KEYS = (
+    "gnb-address",
+    "supi",
+    "mcc",
+    "mnc",
+    "usim-key",
+    "sd",
+    "sst",
+    "usim-opc",
+    "imei",
+)
+_GET_CONFIG_VALUES = operator.itemgetter(*_REQUIRED_CONFIG_KEYS)
+
+_ACTIVE_STATUS = ActiveStatus()
+
+_UE_TEMPLATE = (pathlib.Path(__file__).parent / "templates" / "ue-config.yaml").read_text()
+
 
 class UESIMOperatorCharm(CharmBase):
     """Main class to describe juju event handling for the UE RAN simulator operator."""
@@ -33,14 +52,15 @@ class UESIMOperatorCharm(CharmBase):
     def __init__(self, *args):
         super().__init__(*args)
 
-        self._stored.set_default(ue_running=False)
+        self._stored.set_default(ue_running=False, config_digest=0, cfg_fingerprint=0)
 
         self._uesim_container_name = self._uesim_service_name = "uesim"
         self._uesim_container = self.unit.get_container(self._uesim_container_name)
+        self._layer_added = False
         self.framework.observe(self.on.install, self._on_install)
         self.framework.observe(self.on.remove, self._on_remove)
         self.framework.observe(self.on.config_changed, self._configure)
-        self.framework.observe(self.on.uesim_pebble_ready, self._configure)
+        self.framework.observe(self.on.uesim_pebble_ready, self._on_uesim_pebble_ready)
         self.framework.observe(self.on.start_ue_action, self._on_start_ue_action)
         self.framework.observe(self.on.stop_ue_action, self._on_stop_ue_action)
 
@@ -52,35 +72,65 @@ class UESIMOperatorCharm(CharmBase):
         Args:
             event: Juju event
         """
-        if invalid_configs := self._get_invalid_configs():
-            self.unit.status = BlockedStatus(f"Configurations are invalid: {invalid_configs}")
+        cfg = dict(self.model.config)
+        if invalid_configs := self._get_invalid_configs(cfg):
+            self._set_unit_status(BlockedStatus(f"Configurations are invalid: {invalid_configs}"))
             return
         if not self._uesim_container.can_connect():
-            self.unit.status = WaitingStatus("Waiting for container to be ready")
+            self._set_unit_status(WaitingStatus("Waiting for container to be ready"))
             return
         if not self._uesim_container.exists(path=BASE_CONFIG_PATH):
-            self.unit.status = WaitingStatus("Waiting for storage to be attached")
+            self._set_unit_status(WaitingStatus("Waiting for storage to be attached"))
             return
 
-        content = self._render_ue_config_file(
-            mcc=self._get_mcc_from_config(),  # type: ignore[arg-type]
-            mnc=self._get_mnc_from_config(),  # type: ignore[arg-type]
-            sd=self._get_sd_from_config(),  # type: ignore[arg-type]
-            sst=self._get_sst_from_config(),  # type: ignore[arg-type]
-            supi=self._get_supi_from_config(),  # type: ignore[arg-type]
-            usim_key=self._get_usim_key_from_config(),  # type: ignore[arg-type]
-            usim_opc=self._get_usim_opc_from_config(),  # type: ignore[arg-type]
-            imei=self._get_imei_from_config(),  # type: ignore[arg-type]
-            gnb_address=self._get_gnb_address_from_config(),  # type: ignore[arg-type]
-        )
+        fingerprint = self._config_fingerprint(cfg)
+        if fingerprint == self._stored.cfg_fingerprint and self._stored.config_digest:
+            self._configure_uesim_workload()
+            self._set_unit_status(_ACTIVE_STATUS)
+            return
+
+        content = self._render_ue_config_from(cfg)
         if not self._config_file_content_matches(content=content):
             self._write_config_file(content=content)
             self._configure_uesim_workload(restart=True)
-        self.unit.status = ActiveStatus()
+        else:
+            self._configure_uesim_workload()
+        if self._stored.cfg_fingerprint != fingerprint:
+            self._stored.cfg_fingerprint = fingerprint
+        self._set_unit_status(_ACTIVE_STATUS)
+
+    def _on_uesim_pebble_ready(self, event: EventBase) -> None:
+        """Juju event handler for pebble-ready.
+
+        Pebble-ready means the workload container (re)started with a fresh
+        filesystem, so the stored config digest no longer reflects what the
+        container holds. Drop it before reconfiguring so the config file and
+        pebble layer are written again.
+
+        Args:
+            event: Juju event
+        """
+        if self._stored.config_digest:
+            self._stored.config_digest = 0
+        self._layer_added = False
+        self._configure(event)
+
+    def _set_unit_status(self, status: StatusBase) -> None:
+        """Sets the unit status, skipping the status-set call when it is already correct.
+
+        Args:
+            status: Status to set on the unit.
+        """
+        if self.unit.status != status:
+            self.unit.status = status
+
+    @functools.cached_property
+    def _k8s_client(self) -> Client:
+        """Lazily built Kubernetes client, reused across handlers in this process."""
+        return Client()
 
     def _on_install(self, event: InstallEvent) -> None:
-        client = Client()
-        client.apply(
+        self._k8s_client.apply(
             Service(
                 apiVersion="v1",
                 kind="Service",
@@ -103,17 +153,77 @@ class UESIMOperatorCharm(CharmBase):
         logger.info("Created/asserted existence of UE service")
 
     def _on_remove(self, event: RemoveEvent) -> None:
-        client = Client()
-        client.delete(
+        self._k8s_client.delete(
             Service,
             namespace=self.model.name,
             name=f"{self.app.name}",
         )
         logger.info("Removed external gNB service")
 
+    def _render_ue_config_from(self, cfg: dict) -> str:
+        """Renders the UE config file from a Juju configuration snapshot.
+
+        Args:
+            cfg: Snapshot of the Juju configuration for the current event.
+
+        Returns:
+            str: Rendered ue configuration file
+        """
+        gnb_address, supi, mcc, mnc, usim_key, sd, sst, usim_opc, imei = _GET_CONFIG_VALUES(cfg)
+        return self._render_ue_config_file(
+            mcc=mcc,
+            mnc=mnc,
+            sd=sd,
+            sst=sst,
+            supi=supi,
+            usim_key=usim_key,
+            usim_opc=usim_opc,
+            imei=imei,
+            gnb_address=gnb_address,
+        )
+
+    @staticmethod
+    def _digest(data: str) -> int:
+        """Returns the first 8 bytes of the sha256 of data as an int.
+
+        Ints this small are cheaper for StoredState to pickle and compare
+        than 64-character hex strings.
+        """
+        return int.from_bytes(hashlib.sha256(data.encode()).digest()[:8], "big")
+
+    @classmethod
+    def _config_fingerprint(cls, cfg: dict) -> int:
+        """Returns a stable fingerprint of the config values the UE config file depends on.
+
+        Args:
+            cfg: Snapshot of the Juju configuration for the current event.
+        """
+        return cls._digest(repr(tuple(cfg.get(key) for key in _REQUIRED_CONFIG_KEYS)))
+
+    def _config_is_current(self) -> bool:
+        """Returns whether the workload container already matches the Juju configuration.
+
+        Compares the hash of the freshly rendered content against the hash
+        stored when the config file was last written, then confirms the
+        container actually holds the uesim service and the config file, so a
+        restarted container with stale stored state is not trusted.
+        """
+        cfg = dict(self.model.config)
+        if self._get_invalid_configs(cfg):
+            return False
+        content = self._render_ue_config_from(cfg)
+        if self._digest(content) != self._stored.config_digest:
+            return False
+        if not self._uesim_container.can_connect():
+            return False
+        if not self._uesim_container.get_services(self._uesim_service_name):
+            return False
+        return self._uesim_container.exists(path=f"{BASE_CONFIG_PATH}/{UE_CONFIG_FILE_NAME}")
+
     def _on_start_ue_action(self, event: EventBase) -> None:
         logger.info("Starting UE service")
-        self._configure(event)
+        if not self._config_is_current():
+            self._configure(event)
         if not self._stored.ue_running:
             self._uesim_container.start(self._uesim_service_name)
             logger.info("Started UE service")
@@ -121,7 +231,8 @@ class UESIMOperatorCharm(CharmBase):
 
     def _on_stop_ue_action(self, event: EventBase) -> None:
         logger.info("Stopping UE service")
-        self._configure(event)
+        if not self._config_is_current():
+            self._configure(event)
         if self._stored.ue_running:
             self._uesim_container.stop(self._uesim_service_name)
             logger.info("Stopped UE service")
@@ -133,49 +244,23 @@ class UESIMOperatorCharm(CharmBase):
         Args:
             restart (bool): Whether to restart the uesim container.
         """
+        if self._layer_added and not restart:
+            return
         plan = self._uesim_container.get_plan()
         layer = self._uesim_pebble_layer
         if plan.services != layer.services or restart:
             self._uesim_container.add_layer("uesim", layer, combine=True)
             if self._stored.ue_running:
                 self._uesim_container.restart(self._uesim_service_name)
-
-    def _get_gnb_address_from_config(self) -> Optional[str]:
-        return self.model.config.get("gnb-address")
-
-    def _get_usim_opc_from_config(self) -> Optional[str]:
-        return self.model.config.get("usim-opc")
-
-    def _get_mcc_from_config(self) -> Optional[str]:
-        return self.model.config.get("mcc")
-
-    def _get_imei_from_config(self) -> Optional[str]:
-        return self.model.config.get("imei")
-
-    def _get_mnc_from_config(self) -> Optional[str]:
-        return self.model.config.get("mnc")
-
-    def _get_usim_key_from_config(self) -> Optional[str]:
-        return self.model.config.get("usim-key")
-
-    def _get_sd_from_config(self) -> Optional[str]:
-        return self.model.config.get("sd")
-
-    def _get_sst_from_config(self) -> Optional[int]:
-        return self.model.config.get("sst")  # type: ignore[arg-type]
-
-    def _get_supi_from_config(self) -> Optional[str]:
-        return self.model.config.get("supi")
+        self._layer_added = True
 
     def _write_config_file(self, content: str) -> None:
         self._uesim_container.push(source=content, path=f"{BASE_CONFIG_PATH}/{UE_CONFIG_FILE_NAME}")
+        digest = self._digest(content)
+        if self._stored.config_digest != digest:
+            self._stored.config_digest = digest
         logger.info(f"Config file written {BASE_CONFIG_PATH}/{UE_CONFIG_FILE_NAME}")
 
-    def _ue_config_file_is_written(self) -> bool:
-        if not self._uesim_container.exists(f"{BASE_CONFIG_PATH}/{UE_CONFIG_FILE_NAME}"):
-            return False
-        return True
-
     def _render_ue_config_file(
         self,
         *,
@@ -204,9 +289,7 @@ class UESIMOperatorCharm(CharmBase):
         Returns:
             str: Rendered ue configuration file
         """
-        jinja2_env = Environment(loader=FileSystemLoader("src/templates"))
-        template = jinja2_env.get_template("ue-config.yaml.j2")
-        return template.render(
+        return _UE_TEMPLATE.format(
             mcc=mcc,
             mnc=mnc,
             sd=sd,
@@ -219,42 +302,34 @@ class UESIMOperatorCharm(CharmBase):
         )
 
     def _config_file_content_matches(self, content: str) -> bool:
-        """Returns whether the gnb config file content matches the provided content.
+        """Returns whether the ue config file content matches the provided content.
+
+        Compares against the digest stored when the file was last written,
+        falling back to a Pebble pull only when no digest is stored yet
+        (first run or upgrade from a version that did not store it).
 
         Returns:
-            bool: Whether the gnb config file content matches
+            bool: Whether the ue config file content matches
         """
-        if not self._uesim_container.exists(path=f"{BASE_CONFIG_PATH}/{UE_CONFIG_FILE_NAME}"):
+        if self._stored.config_digest:
+            return self._digest(content) == self._stored.config_digest
+        try:
+            existing_content = self._uesim_container.pull(
+                path=f"{BASE_CONFIG_PATH}/{UE_CONFIG_FILE_NAME}"
+            )
+        except (PathError, FileNotFoundError):
             return False
-        existing_content = self._uesim_container.pull(path=f"{BASE_CONFIG_PATH}/{UE_CONFIG_FILE_NAME}")
-        if existing_content.read() != content:
-            return False
-        return True
-
-    def _get_invalid_configs(self) -> list[str]:  # noqa: C901
-        """Gets list of invalid Juju configurations."""
-        invalid_configs = []
-        if not self._get_gnb_address_from_config():
-            invalid_configs.append("gnb-address")
-        if not self._get_supi_from_config():
-            invalid_configs.append("supi")
-        if not self._get_mcc_from_config():
-            invalid_configs.append("mcc")
-        if not self._get_mnc_from_config():
-            invalid_configs.append("mnc")
-        if not self._get_usim_key_from_config():
-            invalid_configs.append("usim-key")
-        if not self._get_sd_from_config():
-            invalid_configs.append("sd")
-        if not self._get_sst_from_config():
-            invalid_configs.append("sst")
-        if not self._get_usim_opc_from_config():
-            invalid_configs.append("usim-opc")
-        if not self._get_imei_from_config():
-            invalid_configs.append("imei")
-        return invalid_configs
-
-    @property
+        return existing_content.read() == content
+
+    def _get_invalid_configs(self, cfg: dict) -> list[str]:
+        """Gets list of invalid Juju configurations.
+
+        Args:
+            cfg: Snapshot of the Juju configuration for the current event.
+        """
+        return [key for key in _REQUIRED_CONFIG_KEYS if not cfg.get(key)]
+
+    @functools.cached_property
     def _uesim_pebble_layer(self) -> Layer:
         return Layer(
             {
@@ -0,0 +1,211 @@
+# Copyright 2023 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import unittest
+from unittest.mock import Mock, patch
+
+from ops import testing
+from ops.model import ActiveStatus, BlockedStatus, WaitingStatus
+from ops.pebble import PathError
+
+from charm import UESIMOperatorCharm
+
+UE_CONFIG_PATH = "/etc/ue.yaml"
+
+
+def read_file(path: str) -> str:
+    """Reads a file and returns as a string.
+
+    Args:
+        path (str): path to the file.
+
+    Returns:
+        str: content of the file.
+    """
+    with open(path, "r") as f:
+        content = f.read()
+    return content
+
+
+def expected_ue_config() -> str:
+    """Renders the UE config template with the default charm configuration.
+
+    Returns:
+        str: Expected ue configuration file content
+    """
+    return read_file("src/templates/ue-config.yaml").format(
+        mcc="208",
+        mnc="93",
+        sd="010203",
+        sst=1,
+        supi="imsi-208930100007487",
+        usim_key="5122250214c33e723a5dd523fc145fc0",
+        usim_opc="981d464c7c52eb6e5036234984ad0bcf",
+        imei="356938035643803",
+        gnb_address="127.0.0.1",
+    )
+
+
+class TestUESIMCharm(unittest.TestCase):
+    def setUp(self):
+        self.harness = testing.Harness(UESIMOperatorCharm)
+        self.harness.set_model_name(name="whatever")
+        self.addCleanup(self.harness.cleanup)
+        self.harness.begin()
+
+    def test_given_invalid_config_when_config_changed_then_status_is_blocked(
+        self,
+    ):
+        self.harness.update_config(key_values={"mcc": ""})
+
+        self.assertEqual(
+            self.harness.charm.unit.status,
+            BlockedStatus("Configurations are invalid: ['mcc']"),
+        )
+
+    def test_given_cant_connect_to_workload_when_config_changed_then_status_is_waiting(
+        self,
+    ):
+        self.harness.set_can_connect(container="uesim", val=False)
+
+        self.harness.update_config(key_values={})
+
+        self.assertEqual(
+            self.harness.charm.unit.status,
+            WaitingStatus("Waiting for container to be ready"),
+        )
+
+    @patch("ops.model.Container.add_layer")
+    @patch("ops.model.Container.get_plan")
+    @patch("ops.model.Container.pull")
+    @patch("ops.model.Container.push")
+    @patch("ops.model.Container.exists")
+    def test_given_default_config_when_config_changed_then_config_is_written_to_workload(
+        self,
+        patch_exists,
+        patch_push,
+        patch_pull,
+        patch_get_plan,
+        patch_add_layer,
+    ):
+        patch_exists.return_value = True
+        patch_pull.side_effect = PathError("not-found", "config file not found")
+        patch_get_plan.return_value = Mock(services={})
+        self.harness.set_can_connect(container="uesim", val=True)
+
+        self.harness.update_config(key_values={})
+
+        patch_push.assert_called_with(source=expected_ue_config(), path=UE_CONFIG_PATH)
+        self.assertEqual(self.harness.charm.unit.status, ActiveStatus())
+
+    @patch("ops.model.Container.add_layer")
+    @patch("ops.model.Container.get_plan")
+    @patch("ops.model.Container.pull")
+    @patch("ops.model.Container.push")
+    @patch("ops.model.Container.exists")
+    def test_given_unchanged_config_when_config_changed_again_then_write_is_skipped(
+        self,
+        patch_exists,
+        patch_push,
+        patch_pull,
+        patch_get_plan,
+        patch_add_layer,
+    ):
+        patch_exists.return_value = True
+        patch_pull.side_effect = PathError("not-found", "config file not found")
+        patch_get_plan.return_value = Mock(services={})
+        self.harness.set_can_connect(container="uesim", val=True)
+        self.harness.update_config(key_values={})
+        patch_push.reset_mock()
+
+        self.harness.update_config(key_values={})
+
+        patch_push.assert_not_called()
+        self.assertEqual(self.harness.charm.unit.status, ActiveStatus())
+
+    @patch("ops.model.Container.add_layer")
+    @patch("ops.model.Container.get_plan")
+    @patch("ops.model.Container.pull")
+    @patch("ops.model.Container.push")
+    @patch("ops.model.Container.exists")
+    def test_given_container_restarted_when_pebble_ready_then_config_is_rewritten(
+        self,
+        patch_exists,
+        patch_push,
+        patch_pull,
+        patch_get_plan,
+        patch_add_layer,
+    ):
+        patch_exists.return_value = True
+        patch_pull.side_effect = PathError("not-found", "config file not found")
+        patch_get_plan.return_value = Mock(services={})
+        self.harness.set_can_connect(container="uesim", val=True)
+        self.harness.update_config(key_values={})
+        patch_push.reset_mock()
+        patch_add_layer.reset_mock()
+
+        self.harness.container_pebble_ready(container_name="uesim")
+
+        patch_push.assert_called_with(source=expected_ue_config(), path=UE_CONFIG_PATH)
+        patch_add_layer.assert_called()
+        self.assertEqual(self.harness.charm.unit.status, ActiveStatus())
+
+    @patch("ops.model.Container.start")
+    @patch("ops.model.Container.get_services")
+    @patch("ops.model.Container.add_layer")
+    @patch("ops.model.Container.get_plan")
+    @patch("ops.model.Container.pull")
+    @patch("ops.model.Container.push")
+    @patch("ops.model.Container.exists")
+    def test_given_uesim_service_missing_when_start_ue_action_then_configure_is_rerun(
+        self,
+        patch_exists,
+        patch_push,
+        patch_pull,
+        patch_get_plan,
+        patch_add_layer,
+        patch_get_services,
+        patch_start,
+    ):
+        patch_exists.return_value = True
+        patch_pull.side_effect = PathError("not-found", "config file not found")
+        patch_get_plan.return_value = Mock(services={})
+        patch_get_services.return_value = {}
+        self.harness.set_can_connect(container="uesim", val=True)
+        self.harness.update_config(key_values={})
+
+        with patch.object(self.harness.charm, "_configure") as patch_configure:
+            self.harness.charm._on_start_ue_action(Mock())
+
+        patch_configure.assert_called()
+        patch_start.assert_called_with("uesim")
+
+    @patch("ops.model.Container.start")
+    @patch("ops.model.Container.get_services")
+    @patch("ops.model.Container.add_layer")
+    @patch("ops.model.Container.get_plan")
+    @patch("ops.model.Container.pull")
+    @patch("ops.model.Container.push")
+    @patch("ops.model.Container.exists")
+    def test_given_config_current_when_start_ue_action_then_configure_is_skipped(
+        self,
+        patch_exists,
+        patch_push,
+        patch_pull,
+        patch_get_plan,
+        patch_add_layer,
+        patch_get_services,
+        patch_start,
+    ):
+        patch_exists.return_value = True
+        patch_pull.side_effect = PathError("not-found", "config file not found")
+        patch_get_plan.return_value = Mock(services={})
+        patch_get_services.return_value = {"uesim": Mock()}
+        self.harness.set_can_connect(container="uesim", val=True)
+        self.harness.update_config(key_values={})
+
+        with patch.object(self.harness.charm, "_configure") as patch_configure:
+            self.harness.charm._on_start_ue_action(Mock())
+
+        patch_configure.assert_not_called()
+        patch_start.assert_called_with("uesim")